@@ -0,0 +1,53 @@
+"""Per-host circuit breaker so a downed upstream fails fast instead of retrying."""
+from __future__ import annotations
+
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Open after ``fail_max`` consecutive failures; allow a probe after ``reset_timeout``.
+
+    State is plain data (``failures``, ``opened_at`` as wall-clock time) so callers can
+    persist it between CLI runs; a single run rarely sees enough failures to trip it.
+    """
+
+    def __init__(
+        self,
+        fail_max: int,
+        reset_timeout: float,
+        *,
+        failures: int = 0,
+        opened_at: float | None = None,
+    ) -> None:
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.failures = failures
+        self.opened_at = opened_at
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.time() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        return self.state != OPEN
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        # A failed half-open probe re-opens immediately.
+        if self.opened_at is not None or self.failures >= self.fail_max:
+            self.opened_at = time.time()
+
+
+__all__ = ["CircuitBreaker"]
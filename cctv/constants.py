@@ -1,4 +1,5 @@
 """Shared constants for the cctv weather CLI."""
+from pathlib import Path
 
 LOGGER_NAME = "cctv_weather"
 
@@ -7,14 +8,24 @@ FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
 
 REQUEST_TIMEOUT_SECONDS = 10
 MAX_RETRIES = 3
-RETRY_BACKOFF_SECONDS = 1
-RETRY_BACKOFF_MAX_SECONDS = 3
+RETRY_BACKOFF_SECONDS = 2
+RETRY_BACKOFF_MAX_SECONDS = 4
 
+CACHE_DIR = Path("~/.cache/cctv").expanduser()
+GEOCODE_CACHE_TTL_SECONDS = 24 * 60 * 60
+FORECAST_CACHE_TTL_SECONDS = 10 * 60
+
+CIRCUIT_FAIL_MAX = 5
+CIRCUIT_RESET_TIMEOUT_SECONDS = 30
+# Persisted breaker state expires so failures from unrelated, older runs don't add up.
+CIRCUIT_STATE_TTL_SECONDS = 10 * CIRCUIT_RESET_TIMEOUT_SECONDS
+
+OPENAI_HOST = "api.openai.com"
 MODEL_ID = "gpt-4o-mini"
 SYSTEM_PROMPT = "You are a concise weather and clothing assistant."
 SUMMARY_TEMPLATE = (
-    "Summarize today's weather for {display}. "
-    "Use this observation data: {observation}. "
+    "Summarize today's weather for %(display)s. "
+    "Use this observation data: %(observation)s. "
     "Give a short headline, current temp in Celsius, wind, and a quick clothing tip."
 )
 
@@ -2,23 +2,49 @@
 from __future__ import annotations
 
 import argparse
-import json
 import logging
-import uuid
+import secrets
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
+from urllib.parse import urlparse
 
+import orjson
 import requests
-from openai import APIConnectionError, APIError, APITimeoutError, OpenAI, RateLimitError
-from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random
+from diskcache import Cache, Timeout
+from openai import (
+    APIConnectionError,
+    APIError,
+    APITimeoutError,
+    DefaultHttpxClient,
+    OpenAI,
+    RateLimitError,
+)
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
+from cctv.circuit_breaker import CircuitBreaker
 from cctv.constants import (
+    CACHE_DIR,
+    CIRCUIT_FAIL_MAX,
+    CIRCUIT_RESET_TIMEOUT_SECONDS,
+    CIRCUIT_STATE_TTL_SECONDS,
+    FORECAST_CACHE_TTL_SECONDS,
     FORECAST_URL,
+    GEOCODE_CACHE_TTL_SECONDS,
     GEOCODE_URL,
     LOG_FORMAT,
     LOG_LEVEL,
     LOGGER_NAME,
     MAX_RETRIES,
     MODEL_ID,
+    OPENAI_HOST,
     REQUEST_TIMEOUT_SECONDS,
     RETRY_BACKOFF_MAX_SECONDS,
     RETRY_BACKOFF_SECONDS,
@@ -30,10 +56,15 @@ from cctv.env_loader import load_env
 logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
 log = logging.getLogger(LOGGER_NAME)
 
+# Geocode and forecast both hit open-meteo in one run; a shared session keeps the
+# connection alive between them. Retries are left to tenacity.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0))
+
 
 def _is_retriable_requests(exc: Exception) -> bool:
     if isinstance(exc, requests.HTTPError):
-        status = exc.response.status_code if exc.response else None
+        status = exc.response.status_code if exc.response is not None else None
         return status is None or status == 429 or 500 <= status < 600
     return isinstance(exc, requests.RequestException)
 
@@ -47,50 +78,180 @@ def _is_retriable_openai(exc: Exception) -> bool:
     return False
 
 
+# The cache is an optimization only: if it cannot be opened, read or written
+# (read-only HOME, sandbox), lookups fall through to the HTTP call.
+_CACHE_ERRORS = (OSError, sqlite3.Error, Timeout)
+_cache: Cache | None = None
+_cache_unavailable = False
+
+
+def _get_cache() -> Cache | None:
+    global _cache, _cache_unavailable
+    if _cache is None and not _cache_unavailable:
+        try:
+            _cache = Cache(str(CACHE_DIR))
+        except _CACHE_ERRORS as exc:
+            log.warning("Disk cache at %s unavailable, continuing without it: %s", CACHE_DIR, exc)
+            _cache_unavailable = True
+    return _cache
+
+
+def _cache_get(key: tuple) -> Any:
+    cache = _get_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(key)
+    except _CACHE_ERRORS as exc:
+        log.warning("Disk cache read failed for %s: %s", key, exc)
+        return None
+
+
+def _cache_set(key: tuple, value: Any, *, expire: float | None = None) -> None:
+    cache = _get_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(key, value, expire=expire)
+    except _CACHE_ERRORS as exc:
+        log.warning("Disk cache write failed for %s: %s", key, exc)
+
+
+_client: OpenAI | None = None
+
+
+def _get_client() -> OpenAI:
+    """Return the process-wide OpenAI client so its connection pool is reused across calls."""
+    global _client
+    if _client is None:
+        # Retries are handled by tenacity in create_chat_with_retry.
+        _client = OpenAI(
+            max_retries=0,
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            http_client=DefaultHttpxClient(),
+        )
+    return _client
+
+
+def _retry_after_seconds(exc: BaseException | None) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_backoff = wait_random_exponential(multiplier=RETRY_BACKOFF_SECONDS, max=RETRY_BACKOFF_MAX_SECONDS)
+
+
+def _stop_if_retry_after_too_long(retry_state: RetryCallState) -> bool:
+    """Give up when the server asks for a longer wait than the CLI is willing to sleep."""
+    retry_after = _retry_after_seconds(retry_state.outcome.exception())
+    return retry_after is not None and retry_after > RETRY_BACKOFF_MAX_SECONDS
+
+
+_stop = stop_after_attempt(MAX_RETRIES) | _stop_if_retry_after_too_long
+
+
+def _wait_for_retry(retry_state: RetryCallState) -> float:
+    """Honor a server's Retry-After (capped); otherwise back off exponentially with full jitter."""
+    retry_after = _retry_after_seconds(retry_state.outcome.exception())
+    if retry_after is not None:
+        return min(retry_after, RETRY_BACKOFF_MAX_SECONDS)
+    return _backoff(retry_state)
+
+
+def _check_breaker(host: str) -> CircuitBreaker:
+    """Load the host's breaker from the disk cache so failures count across CLI runs."""
+    failures, opened_at = _cache_get(("breaker", host)) or (0, None)
+    breaker = CircuitBreaker(
+        CIRCUIT_FAIL_MAX, CIRCUIT_RESET_TIMEOUT_SECONDS, failures=failures, opened_at=opened_at
+    )
+    if not breaker.allow():
+        raise SystemExit(f"{host} is failing; circuit open, try again later.")
+    return breaker
+
+
+def _save_breaker(host: str, breaker: CircuitBreaker) -> None:
+    _cache_set(
+        ("breaker", host),
+        (breaker.failures, breaker.opened_at),
+        expire=CIRCUIT_STATE_TTL_SECONDS,
+    )
+
+
 @retry(
     retry=retry_if_exception(_is_retriable_requests),
-    stop=stop_after_attempt(MAX_RETRIES),
-    wait=wait_random(min=RETRY_BACKOFF_SECONDS, max=RETRY_BACKOFF_MAX_SECONDS),
+    stop=_stop,
+    wait=_wait_for_retry,
     reraise=True,
 )
 def get_with_retry(url: str, *, params: dict[str, Any]) -> requests.Response:
-    headers = {"X-Client-Request-Id": str(uuid.uuid4())}
-    resp = requests.get(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS, headers=headers)
-    resp.raise_for_status()
+    host = urlparse(url).hostname or url
+    breaker = _check_breaker(host)
+    headers = {"X-Client-Request-Id": secrets.token_hex(16)}
+    try:
+        resp = _session.get(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS, headers=headers)
+        resp.raise_for_status()
+    except Exception as exc:
+        if _is_retriable_requests(exc):
+            breaker.record_failure()
+            _save_breaker(host, breaker)
+        raise
+    if breaker.failures:
+        breaker.record_success()
+        _save_breaker(host, breaker)
     return resp
 
 
 @retry(
     retry=retry_if_exception(_is_retriable_openai),
-    stop=stop_after_attempt(MAX_RETRIES),
-    wait=wait_random(min=RETRY_BACKOFF_SECONDS, max=RETRY_BACKOFF_MAX_SECONDS),
+    stop=_stop,
+    wait=_wait_for_retry,
     reraise=True,
 )
 def create_chat_with_retry(client: OpenAI, *, model: str, messages: list[dict]) -> Any:
-    headers = {"X-Client-Request-Id": str(uuid.uuid4())}
-    raw = client.chat.completions.with_raw_response.create(
-        model=model, messages=messages, extra_headers=headers
-    )
+    breaker = _check_breaker(OPENAI_HOST)
+    headers = {"X-Client-Request-Id": secrets.token_hex(16)}
+    try:
+        raw = client.chat.completions.with_raw_response.create(
+            model=model, messages=messages, extra_headers=headers
+        )
+    except Exception as exc:
+        if _is_retriable_openai(exc):
+            breaker.record_failure()
+            _save_breaker(OPENAI_HOST, breaker)
+        raise
+    if breaker.failures:
+        breaker.record_success()
+        _save_breaker(OPENAI_HOST, breaker)
     _log_headers("OpenAI response headers", getattr(raw, "headers", None))
     return raw.parse()
 
 
 def _log_headers(label: str, headers: Any) -> None:
-    if not headers:
+    if not headers or not log.isEnabledFor(logging.INFO):
         return
     try:
-        for k, v in dict(headers).items():
-            log.info(f"{label} {k} : {v}")
-        
+        for k, v in headers.items():
+            log.info("%s %s : %s", label, k, v)
     except Exception:
         header_str = str(headers)
         log.info("%s: %s", label, header_str)
 
 
 def geocode(city: str) -> tuple[float, float, str]:
+    cache_key = ("geocode", city.lower().strip())
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     resp = get_with_retry(GEOCODE_URL, params={"name": city, "count": 1})
     _log_headers("Geocode response headers", getattr(resp, "headers", None))
-    data = resp.json()
+    data = orjson.loads(resp.content)
     results = data.get("results") or []
     if not results:
         raise SystemExit(f"No location found for '{city}'.")
@@ -99,38 +260,41 @@ def geocode(city: str) -> tuple[float, float, str]:
         display = ", ".join(
             part for part in [match.get("name"), match.get("admin1"), match.get("country")] if part
         )
-        return float(match["latitude"]), float(match["longitude"]), display
+        location = float(match["latitude"]), float(match["longitude"]), display
     except (KeyError, IndexError, ValueError, TypeError) as exc:
         log.error("Error parsing geocoding response for city %s: %s", city, exc)
         raise SystemExit(f"Failed to parse geocoding response for '{city}'.")
+    _cache_set(cache_key, location, expire=GEOCODE_CACHE_TTL_SECONDS)
+    return location
 
 
 def fetch_weather(lat: float, lon: float) -> dict:
+    cache_key = ("forecast", round(lat, 2), round(lon, 2))
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     resp = get_with_retry(
         FORECAST_URL,
         params={"latitude": lat, "longitude": lon, "current_weather": True, "timezone": "auto"},
     )
     _log_headers("Forecast response headers", getattr(resp, "headers", None))
-    data = resp.json()
+    data = orjson.loads(resp.content)
     if "current_weather" not in data:
         raise SystemExit("Weather data missing from response.")
-    return data["current_weather"]
+    current = data["current_weather"]
+    _cache_set(cache_key, current, expire=FORECAST_CACHE_TTL_SECONDS)
+    return current
 
 
 def extract_text(response) -> str:
-    if not response:
-        return ""
-
-    choices = getattr(response, "choices", None) or []
-    if not choices:
-        return ""
-
     try:
-        message = choices[0].message
-        content = message.content
+        content = response.choices[0].message.content
     except (AttributeError, IndexError, TypeError):
         return ""
 
+    if type(content) is str:
+        return content.strip()
     if isinstance(content, list):
         chunks = [part.text for part in content if getattr(part, "type", "") == "text"]
         return "".join(chunks).strip()
@@ -139,17 +303,28 @@ def extract_text(response) -> str:
     return ""
 
 
+def _summary_prompt(display: str, observation: dict) -> str:
+    return SUMMARY_TEMPLATE % {
+        "display": display,
+        "observation": orjson.dumps(observation).decode(),
+    }
+
+
 def run(city: str) -> str:
     load_env()
-    client = OpenAI()
-    lat, lon, display = geocode(city)
-    current = fetch_weather(lat, lon)
+    # Geocode -> forecast is a dependency chain, but building the OpenAI client
+    # (httpx + TLS context setup) is independent, so overlap it with the HTTP calls.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        client_future = pool.submit(_get_client)
+        lat, lon, display = geocode(city)
+        current = fetch_weather(lat, lon)
+        client = client_future.result()
 
     prompt = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {
             "role": "user",
-            "content": SUMMARY_TEMPLATE.format(display=display, observation=json.dumps(current)),
+            "content": _summary_prompt(display, current),
         },
     ]
 
@@ -1,8 +1,27 @@
+import sqlite3
 import sys
+import tempfile
+import time
 from types import SimpleNamespace
 from unittest import TestCase, mock
 
+import orjson
+import requests
+from diskcache import Cache
+
 import main as cm
+from cctv.circuit_breaker import CircuitBreaker
+
+
+class TempCacheTestCase(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        cache = Cache(tmpdir.name)
+        self.addCleanup(cache.close)
+        patcher = mock.patch("main._get_cache", return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
 
 class ExtractTextTests(TestCase):
@@ -29,57 +48,224 @@ class ExtractTextTests(TestCase):
 
     def test_extract_text_missing(self):
         self.assertEqual(cm.extract_text(None), "")
+        self.assertEqual(cm.extract_text(SimpleNamespace(choices=[])), "")
+        self.assertEqual(cm.extract_text(SimpleNamespace(choices=None)), "")
+
+
+class GetWithRetryTests(TempCacheTestCase):
+    @mock.patch("main._session")
+    def test_get_with_retry_uses_shared_session(self, mock_session):
+        mock_resp = mock.Mock()
+        mock_session.get.return_value = mock_resp
+
+        self.assertIs(cm.get_with_retry("https://example.test", params={"q": 1}), mock_resp)
+        mock_session.get.assert_called_once()
+        mock_resp.raise_for_status.assert_called_once()
+
+    @mock.patch("tenacity.nap.time.sleep")
+    @mock.patch("main._session")
+    def test_retry_after_beyond_cap_stops_retrying(self, mock_session, mock_sleep):
+        resp = requests.Response()
+        resp.status_code = 429
+        resp.headers["Retry-After"] = "3600"
+        mock_session.get.return_value = resp
+
+        with self.assertRaises(requests.HTTPError):
+            cm.get_with_retry("https://example.test", params={})
+        mock_session.get.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @mock.patch("tenacity.nap.time.sleep")
+    @mock.patch("main._session")
+    def test_client_error_is_not_retried(self, mock_session, _sleep):
+        resp = requests.Response()
+        resp.status_code = 404
+        mock_session.get.return_value = resp
+
+        with self.assertRaises(requests.HTTPError):
+            cm.get_with_retry("https://example.test", params={})
+        mock_session.get.assert_called_once()
+
+    @mock.patch("tenacity.nap.time.sleep")
+    @mock.patch("main._session")
+    def test_server_error_is_retried(self, mock_session, _sleep):
+        resp = requests.Response()
+        resp.status_code = 503
+        mock_session.get.return_value = resp
 
+        with self.assertRaises(requests.HTTPError):
+            cm.get_with_retry("https://example.test", params={})
+        self.assertEqual(mock_session.get.call_count, cm.MAX_RETRIES)
 
-class GeocodeTests(TestCase):
+
+class RetryWaitTests(TestCase):
+    def _state(self, exc, attempt=1):
+        return SimpleNamespace(
+            attempt_number=attempt, outcome=SimpleNamespace(exception=lambda: exc)
+        )
+
+    def test_honors_retry_after_header(self):
+        exc = SimpleNamespace(response=SimpleNamespace(headers={"Retry-After": "3"}))
+        self.assertEqual(cm._wait_for_retry(self._state(exc)), 3.0)
+
+    def test_falls_back_to_jittered_backoff(self):
+        wait = cm._wait_for_retry(self._state(ValueError("boom"), attempt=3))
+        self.assertGreaterEqual(wait, 0)
+        self.assertLessEqual(wait, cm.RETRY_BACKOFF_MAX_SECONDS)
+
+    @mock.patch("tenacity.wait.random.uniform", side_effect=lambda low, high: high)
+    def test_backoff_ceiling_grows_to_max_within_retry_budget(self, _uniform):
+        ceilings = [
+            cm._wait_for_retry(self._state(ValueError("boom"), attempt=n))
+            for n in range(1, cm.MAX_RETRIES)
+        ]
+        self.assertEqual(ceilings, sorted(ceilings))
+        self.assertGreater(ceilings[0], 1)
+        self.assertEqual(ceilings[-1], cm.RETRY_BACKOFF_MAX_SECONDS)
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_fail_max_and_probes_after_timeout(self):
+        breaker = CircuitBreaker(fail_max=2, reset_timeout=30)
+        with mock.patch("cctv.circuit_breaker.time.time", return_value=100.0):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+        with mock.patch("cctv.circuit_breaker.time.time", return_value=130.0):
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+        self.assertEqual(breaker.failures, 0)
+        self.assertTrue(breaker.allow())
+
+
+class CircuitBreakerAcrossRunsTests(TempCacheTestCase):
+    @mock.patch("tenacity.nap.time.sleep")
+    @mock.patch("main._session")
+    def test_repeated_failed_runs_open_circuit_and_fail_fast(self, mock_session, _sleep):
+        mock_session.get.side_effect = requests.ConnectionError("down")
+
+        # First run: all MAX_RETRIES attempts fail and are recorded.
+        with self.assertRaises(requests.ConnectionError):
+            cm.get_with_retry("https://api.open-meteo.com/v1/forecast", params={})
+        self.assertEqual(mock_session.get.call_count, cm.MAX_RETRIES)
+
+        # Second run: the persisted failures reach CIRCUIT_FAIL_MAX and the circuit opens.
+        with self.assertRaises(SystemExit):
+            cm.get_with_retry("https://api.open-meteo.com/v1/forecast", params={})
+        self.assertEqual(mock_session.get.call_count, cm.CIRCUIT_FAIL_MAX)
+
+        # Third run: fails fast without touching the network.
+        with self.assertRaises(SystemExit):
+            cm.get_with_retry("https://api.open-meteo.com/v1/forecast", params={})
+        self.assertEqual(mock_session.get.call_count, cm.CIRCUIT_FAIL_MAX)
+
+        # Persisted state expires so stale failures don't count toward a later run.
+        _, expire_time = cm._get_cache().get(
+            ("breaker", "api.open-meteo.com"), expire_time=True
+        )
+        self.assertIsNotNone(expire_time)
+        self.assertLessEqual(expire_time - time.time(), cm.CIRCUIT_STATE_TTL_SECONDS)
+
+        # Other hosts are unaffected.
+        mock_session.get.side_effect = None
+        cm.get_with_retry("https://geocoding-api.open-meteo.com/v1/search", params={})
+
+
+class GeocodeTests(TempCacheTestCase):
     @mock.patch("main.get_with_retry")
     def test_geocode_success(self, mock_get):
         mock_resp = mock.Mock()
-        mock_resp.json.return_value = {
-            "results": [
-                {
-                    "name": "Dali",
-                    "admin1": "Yunnan",
-                    "country": "China",
-                    "latitude": 25.6,
-                    "longitude": 100.2,
-                }
-            ]
-        }
+        mock_resp.content = orjson.dumps(
+            {
+                "results": [
+                    {
+                        "name": "Dali",
+                        "admin1": "Yunnan",
+                        "country": "China",
+                        "latitude": 25.6,
+                        "longitude": 100.2,
+                    }
+                ]
+            }
+        )
         mock_get.return_value = mock_resp
 
         lat, lon, display = cm.geocode("Dali")
         self.assertEqual((lat, lon), (25.6, 100.2))
         self.assertEqual(display, "Dali, Yunnan, China")
 
+        self.assertEqual(cm.geocode(" dali "), (25.6, 100.2, "Dali, Yunnan, China"))
+        mock_get.assert_called_once()
+
     @mock.patch("main.get_with_retry")
     def test_geocode_no_results_exits(self, mock_get):
         mock_resp = mock.Mock()
-        mock_resp.json.return_value = {"results": []}
+        mock_resp.content = b'{"results": []}'
         mock_get.return_value = mock_resp
         with self.assertRaises(SystemExit):
             cm.geocode("Nowhere")
 
 
-class FetchWeatherTests(TestCase):
+class CacheFallbackTests(TestCase):
+    def _dali_response(self):
+        mock_resp = mock.Mock()
+        mock_resp.content = b'{"results": [{"name": "Dali", "latitude": 25.6, "longitude": 100.2}]}'
+        return mock_resp
+
+    @mock.patch("main._cache_unavailable", False)
+    @mock.patch("main._cache", None)
+    @mock.patch("main.Cache", side_effect=FileNotFoundError("Cache directory could not be created"))
+    @mock.patch("main.get_with_retry")
+    def test_geocode_without_cache_dir_uses_http(self, mock_get, mock_cache):
+        mock_get.return_value = self._dali_response()
+
+        self.assertEqual(cm.geocode("Dali"), (25.6, 100.2, "Dali"))
+        self.assertEqual(cm.geocode("Dali"), (25.6, 100.2, "Dali"))
+        self.assertEqual(mock_get.call_count, 2)
+        mock_cache.assert_called_once()
+
+    @mock.patch("main.get_with_retry")
+    def test_geocode_survives_cache_read_and_write_errors(self, mock_get):
+        mock_get.return_value = self._dali_response()
+        broken = mock.Mock()
+        broken.get.side_effect = sqlite3.OperationalError("attempt to write a readonly database")
+        broken.set.side_effect = OSError("read-only file system")
+
+        with mock.patch("main._get_cache", return_value=broken):
+            self.assertEqual(cm.geocode("Dali"), (25.6, 100.2, "Dali"))
+        mock_get.assert_called_once()
+
+
+class FetchWeatherTests(TempCacheTestCase):
     @mock.patch("main.get_with_retry")
     def test_fetch_weather_returns_current_weather(self, mock_get):
         mock_resp = mock.Mock()
-        mock_resp.json.return_value = {"current_weather": {"temperature": 20}}
+        mock_resp.content = b'{"current_weather": {"temperature": 20}}'
         mock_get.return_value = mock_resp
 
         self.assertEqual(cm.fetch_weather(1.0, 2.0), {"temperature": 20})
+        self.assertEqual(cm.fetch_weather(1.001, 2.001), {"temperature": 20})
+        mock_get.assert_called_once()
 
     @mock.patch("main.get_with_retry")
     def test_fetch_weather_missing_current_weather_exits(self, mock_get):
         mock_resp = mock.Mock()
-        mock_resp.json.return_value = {}
+        mock_resp.content = b"{}"
         mock_get.return_value = mock_resp
         with self.assertRaises(SystemExit):
             cm.fetch_weather(1.0, 2.0)
 
 
+class SummaryPromptTests(TestCase):
+    def test_summary_prompt_accepts_nested_observation(self):
+        prompt = cm._summary_prompt("Test Place", {"temperature": 21, "hourly": [1, 2]})
+        self.assertIn("Test Place", prompt)
+        self.assertIn('{"temperature":21,"hourly":[1,2]}', prompt)
+
+
 class RunFlowTests(TestCase):
+    @mock.patch("main._client", None)
     @mock.patch("main.load_env")
     @mock.patch("main.create_chat_with_retry")
     @mock.patch("main.fetch_weather")
@@ -98,6 +284,18 @@ class RunFlowTests(TestCase):
         mock_geocode.assert_called_once_with("Test City")
         mock_fetch.assert_called_once_with(1.0, 2.0)
         mock_chat.assert_called_once()
+        mock_openai.assert_called_once()
+        self.assertIs(mock_chat.call_args.args[0], mock_openai.return_value)
+        user_content = mock_chat.call_args.kwargs["messages"][1]["content"]
+        self.assertIn("Test Place", user_content)
+        self.assertIn('{"temperature":21,"windspeed":4}', user_content)
+
+    @mock.patch("main._client", None)
+    @mock.patch("main.OpenAI")
+    def test_get_client_is_shared(self, mock_openai):
+        self.assertIs(cm._get_client(), cm._get_client())
+        mock_openai.assert_called_once()
+        self.assertEqual(mock_openai.call_args.kwargs["max_retries"], 0)
 
     @mock.patch("main.run")
     def test_main_prints_output(self, mock_run):